@@ -7,24 +7,41 @@
 # ------------------------------------------------------
 
 import os
+import sys
+import hashlib
+import pickle
+import sqlite3
 import asyncio
 import logging
+import logging.handlers
+import queue
+import atexit
 import re
 import time
 import random
+from collections import OrderedDict, deque
+import httpx
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 from telegram import Update
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import (
+    AIORateLimiter,
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
     ContextTypes,
     filters,
-    PicklePersistence
+    BasePersistence,
+    PersistenceInput
 )
 
 from google import genai
+from google.genai import errors as gerr
+from google.genai import types as genai_types
 
 
 # -------------------- LOAD ENV --------------------
@@ -33,81 +50,439 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 
+# optional: set WEBHOOK_URL to receive updates by webhook instead of polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WH_SECRET = os.getenv("WH_SECRET")
+PORT = int(os.getenv("PORT", "8443"))
+
 if not TELEGRAM_TOKEN or not GEMINI_API_KEY or ADMIN_ID == 0:
     raise SystemExit("Please set TELEGRAM_TOKEN, GEMINI_API_KEY, ADMIN_ID in .env")
 
+# without a secret anyone who finds the URL can post updates "from" ADMIN_ID
+if WEBHOOK_URL and not WH_SECRET:
+    raise SystemExit("Please set WH_SECRET in .env when using WEBHOOK_URL")
+
 
 # -------------------- LOGGING --------------------
-logging.basicConfig(level=logging.INFO)
+# handlers only enqueue records; a background thread writes them to stderr.
+# QueueHandler already formats the message, so the listener prints it as is.
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
 log = logging.getLogger(__name__)
 
-genai_client = genai.Client(api_key=GEMINI_API_KEY)
+# a hung request would otherwise hold a GEMINI_LIMIT slot and the chat forever
+GEMINI_TIMEOUT_MS = 15_000
+
+genai_client = genai.Client(
+    api_key=GEMINI_API_KEY,
+    http_options=genai_types.HttpOptions(timeout=GEMINI_TIMEOUT_MS)
+)
+
+
+# -------------------- GREETINGS --------------------
+GREETINGS = frozenset({
+    "hi", "hello", "hey", "hlo", "hola", "namaste", "salam", "assalamualaikum"
+})
+
+# words that may follow the greeting without making it a real message:
+# "hi there", "hello bhai" → greeting; "hey call me" → goes to admin
+GREETING_FILLERS = frozenset({
+    "there", "bhai", "bro", "sir", "dada", "didi", "ji", "all", "everyone"
+})
+
+
+def is_greeting(stripped: str, bot_names=frozenset()) -> bool:
+    words = [w.strip("!.,?@") for w in stripped.split()]
+    if not words or words[0] not in GREETINGS:
+        return False
+    return all(w in GREETING_FILLERS or w in bot_names for w in words[1:])
 
 
 # -------------------- LANG DETECTION --------------------
+# single scan; stops at the first Bengali/Devanagari char
+_LANG = re.compile(r'(?P<bengali>[\u0980-\u09FF])|(?P<hindi>[\u0900-\u097F])')
+
+
 def detect_language(text: str) -> str:
-    if re.search(r'[\u0980-\u09FF]', text):
-        return "bengali"
-    return "english"
+    m = _LANG.search(text)
+    return m.lastgroup if m else "english"
 
 
 # -------------------- TYPING ANIMATION --------------------
-async def type_animation(update: Update, context, text="💬 Bot is typing…", delay=0.6):
+# native "typing…" indicator: no extra message, no artificial delay
+async def type_animation(update: Update, context):
     try:
-        await update.message.reply_text(text)
-    except:
+        await context.bot.send_chat_action(
+            chat_id=update.effective_chat.id,
+            action=ChatAction.TYPING
+        )
+    except TelegramError:
         pass
-    await asyncio.sleep(delay)
 
 
 # -------------------- FALLBACK --------------------
-FALLBACK_RESPONSES = ["Message sent ✅"]
+FALLBACK = "Message sent ✅"
 
 
 # -------------------- SAFE GEMINI CALL --------------------
+# monotonic time of the last 429 / quota error from Gemini
+_quota_hit_at = float("-inf")
+
+# prompt digest -> future of the call already running for it
+_inflight: dict[bytes, asyncio.Future] = {}
+
+
 async def safe_ask_gemini(prompt: str) -> str:
+    key = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+    pending = _inflight.get(key)
+    if pending is not None:
+        # shield: a cancelled waiter mustn't cancel it for the others
+        return await asyncio.shield(pending)
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
     try:
-        return await ask_gemini(prompt)
-    except:
-        return random.choice(FALLBACK_RESPONSES)
+        reply = await _ask_gemini_or_fallback(prompt)
+        fut.set_result(reply)
+        return reply
+    finally:
+        del _inflight[key]
+        if not fut.done():
+            # we were cancelled; don't leave waiters hanging
+            fut.set_result(FALLBACK)
 
 
-# -------------------- GEMINI MAIN CALL --------------------
-async def ask_gemini(prompt: str) -> str:
+# retries for 5xx / connection errors; 429 and timeouts fall back right away
+GEMINI_RETRIES = 2
+
+
+def _retry_delay(e, attempt: int) -> float:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return min(30, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return min(30, 2 ** attempt) + random.random()
 
-    def call():
+
+async def _ask_gemini_or_fallback(prompt: str) -> str:
+    global _quota_hit_at
+    for attempt in range(GEMINI_RETRIES + 1):
         try:
-            resp = genai_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            if hasattr(resp, "text") and resp.text:
-                return resp.text.strip()
-            return "Message sent ✅"
-        except:
-            return "Message sent ✅"
+            return await ask_gemini(prompt)
+        except gerr.APIError as e:
+            if e.code == 429:
+                _quota_hit_at = time.monotonic()
+                return FALLBACK
+            if not isinstance(e, gerr.ServerError) or attempt == GEMINI_RETRIES:
+                log.warning("Gemini error %s: %s", e.code, e.message)
+                return FALLBACK
+            delay = _retry_delay(e, attempt)
+        # network errors from the SDK's httpx transport; a timeout already
+        # cost GEMINI_TIMEOUT_MS, so it isn't retried
+        except httpx.TransportError as e:
+            if isinstance(e, httpx.TimeoutException) or attempt == GEMINI_RETRIES:
+                log.warning("Gemini unreachable: %r", e)
+                return FALLBACK
+            delay = _retry_delay(e, attempt)
+        except Exception:
+            # anything else (e.g. aiohttp errors if it's installed): never
+            # let a welcome crash the handler
+            log.exception("Unexpected Gemini error")
+            return FALLBACK
+        await asyncio.sleep(delay)
+
+
+# -------------------- GEMINI MAIN CALL --------------------
+# cap concurrent requests to Gemini
+GEMINI_LIMIT = asyncio.Semaphore(32)
+
 
-    return await asyncio.to_thread(call)
+async def ask_gemini(prompt: str) -> str:
+    # errors go up to safe_ask_gemini so it can notice quota hits
+    async with GEMINI_LIMIT:
+        resp = await genai_client.aio.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=prompt
+        )
+    if hasattr(resp, "text") and resp.text:
+        return resp.text.strip()
+    return FALLBACK
 
 
 # -------------------- SPAM CONTROL --------------------
+# in-memory only; writing this to user_data re-persisted it every message
+_LAST: dict[int, float] = {}
+
+
 def user_spam(update, context) -> bool:
-    now = time.time()
-    last = context.user_data.get("last_time", 0)
-    if now - last < 1.2:
+    uid = update.effective_user.id
+    now = time.monotonic()
+    if now - _LAST.get(uid, float("-inf")) < 1.2:
         return True
-    context.user_data["last_time"] = now
+    _LAST[uid] = now
     return False
 
 
 # -------------------- PERSISTENCE --------------------
-persistence = PicklePersistence(filepath="bot_data.pkl")
+class _LegacyUnpickler(pickle.Unpickler):
+    # PicklePersistence stores the Bot as a persistent id; we don't need it
+    def persistent_load(self, pid):
+        return None
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    One row per user/chat/bot_data key and one row per forwarded message,
+    so a flush only writes what changed instead of re-pickling everything.
+    Conversations and callback data are not stored.
+    On first start, data from the old PicklePersistence file is imported.
+    """
+
+    def __init__(self, filepath="bot_data.sqlite", legacy_pickle="bot_data.pkl",
+                 update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = sqlite3.connect(filepath)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "scope TEXT, id INTEGER, key TEXT, val BLOB, "
+            "PRIMARY KEY (scope, id, key))"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS forwarded ("
+            "fwd_id INTEGER PRIMARY KEY, chat_id INTEGER)"
+        )
+        # (scope, id) -> {key: pickled value last written}
+        self._written = {}
+        self._forwarded = set()
+
+        if legacy_pickle and os.path.exists(legacy_pickle) and self._is_empty():
+            self._import_pickle(legacy_pickle)
+
+    def _is_empty(self):
+        row = self.db.execute(
+            "SELECT 1 FROM kv UNION ALL SELECT 1 FROM forwarded LIMIT 1"
+        ).fetchone()
+        return row is None
+
+    def _import_pickle(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = _LegacyUnpickler(f).load()
+        except Exception as e:
+            log.error("Could not import %s: %s", path, e)
+            return
+
+        for user_id, user_data in (data.get("user_data") or {}).items():
+            self._save("user", user_id, user_data)
+        for chat_id, chat_data in (data.get("chat_data") or {}).items():
+            self._save("chat", chat_id, chat_data)
+
+        bot_data = dict(data.get("bot_data") or {})
+        fmap = bot_data.pop("forwarded_map", {})
+        self._save("bot", 0, bot_data)
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO forwarded VALUES (?, ?)", fmap.items()
+            )
+        log.info("Imported %s (%d forwarded messages)", path, len(fmap))
+
+    def _load(self, scope):
+        data = {}
+        rows = self.db.execute("SELECT id, key, val FROM kv WHERE scope = ?", (scope,))
+        for id_, key, val in rows:
+            self._written.setdefault((scope, id_), {})[key] = val
+            data.setdefault(id_, {})[key] = pickle.loads(val)
+        return data
+
+    def _save(self, scope, id_, data):
+        written = self._written.setdefault((scope, id_), {})
+        with self.db:
+            for key, val in data.items():
+                blob = pickle.dumps(val)
+                if written.get(key) != blob:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+                        (scope, id_, key, blob)
+                    )
+                    written[key] = blob
+            for key in written.keys() - data.keys():
+                self.db.execute(
+                    "DELETE FROM kv WHERE scope = ? AND id = ? AND key = ?",
+                    (scope, id_, key)
+                )
+                del written[key]
+
+    def _drop(self, scope, id_):
+        self._written.pop((scope, id_), None)
+        with self.db:
+            self.db.execute("DELETE FROM kv WHERE scope = ? AND id = ?", (scope, id_))
+
+    async def get_user_data(self):
+        return self._load("user")
+
+    async def get_chat_data(self):
+        return self._load("chat")
+
+    async def get_bot_data(self):
+        data = self._load("bot").get(0, {})
+        fmap = OrderedDict(
+            self.db.execute("SELECT fwd_id, chat_id FROM forwarded ORDER BY fwd_id")
+        )
+        self._forwarded = set(fmap)
+        data["forwarded_map"] = fmap
+        return data
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_user_data(self, user_id, data):
+        self._save("user", user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._save("chat", chat_id, data)
+
+    async def update_bot_data(self, data):
+        data = dict(data)
+        fmap = data.pop("forwarded_map", {})
+        self._save("bot", 0, data)
+
+        added = fmap.keys() - self._forwarded
+        dropped = self._forwarded - fmap.keys()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO forwarded VALUES (?, ?)",
+                ((k, fmap[k]) for k in added)
+            )
+            self.db.executemany(
+                "DELETE FROM forwarded WHERE fwd_id = ?",
+                ((k,) for k in dropped)
+            )
+        self._forwarded |= added
+        self._forwarded -= dropped
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._drop("user", user_id)
+
+    async def drop_chat_data(self, chat_id):
+        self._drop("chat", chat_id)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        self.db.commit()
+        self.db.close()
+
+
+persistence = SQLitePersistence(filepath="bot_data.sqlite")
+
+# keep only the newest forwards so the store doesn't grow forever
+FORWARDED_MAP_MAX = 10_000
+
+
+def _remember(fmap: OrderedDict, key, val):
+    fmap[key] = val
+    fmap.move_to_end(key)
+    if len(fmap) > FORWARDED_MAP_MAX:
+        fmap.popitem(last=False)
+
+
+# same object as bot_data["forwarded_map"]; bound in post_init
+FORWARDED: OrderedDict = OrderedDict()
+
+
+async def post_init(app):
+    global FORWARDED
+    # bot_data is loaded from persistence by now
+    fmap = app.bot_data.get("forwarded_map", {})
+    if not isinstance(fmap, OrderedDict):
+        fmap = OrderedDict(fmap)
+    while len(fmap) > FORWARDED_MAP_MAX:
+        fmap.popitem(last=False)
+    app.bot_data["forwarded_map"] = FORWARDED = fmap
 
 
 # ------------------------------------------------------
 # SMART GREETING WELCOME
 # ------------------------------------------------------
+_WELCOME = TTLCache(maxsize=4096, ttl=3600)
+
+# skip Gemini for this long after it told us we're out of quota
+QUOTA_COOLDOWN = 60
+
+WELCOME_TEMPLATES = {
+    "english": [
+        "Hi {name}! Welcome, how can I help you? 😊",
+        "Hello {name}, great to see you here! 👋",
+        "Hey {name}! Welcome, feel free to drop your message 🙂",
+        "Welcome {name}! Tell me what you need ✨",
+        "Hi {name}, thanks for reaching out! 🙌",
+    ],
+    "bengali": [
+        "Hi {name}! স্বাগতম, কেমন আছো? 😊",
+        "Hello {name}, তোমাকে দেখে ভালো লাগলো! 👋",
+        "নমস্কার {name}! Welcome, বলো কী দরকার 🙂",
+        "Hey {name}! স্বাগতম, তোমার message পাঠাও ✨",
+        "Hi {name}, যোগাযোগ করার জন্য ধন্যবাদ! 🙌",
+    ],
+    "hindi": [
+        "Hi {name}! स्वागत है, कैसे हो? 😊",
+        "Hello {name}, आपसे मिलकर अच्छा लगा! 👋",
+        "नमस्ते {name}! Welcome, बताइए क्या चाहिए 🙂",
+        "Hey {name}! स्वागत है, अपना message भेजिए ✨",
+        "Hi {name}, संपर्क करने के लिए धन्यवाद! 🙌",
+    ],
+}
+
+
+def template_welcome(name: str, lang: str) -> str:
+    templates = WELCOME_TEMPLATES.get(lang, WELCOME_TEMPLATES["english"])
+    return random.choice(templates).format(name=name)
+
+
 async def smart_welcome(name: str, lang: str) -> str:
+    key = (lang, name.lower())
+    cached = _WELCOME.get(key)
+    if cached:
+        return cached
+
+    if time.monotonic() - _quota_hit_at < QUOTA_COOLDOWN:
+        return template_welcome(name, lang)
+
+    # concurrent misses build the same prompt, so safe_ask_gemini
+    # turns them into one Gemini call
+    reply = await _ask_welcome(name, lang)
+    if reply == FALLBACK:
+        return template_welcome(name, lang)
+    _WELCOME[key] = reply
+    return reply
+
+
+async def _ask_welcome(name: str, lang: str) -> str:
     prompt = f"""
 Make a short friendly welcome message.
 Include user's name: {name}
@@ -167,7 +542,7 @@ async def admin_reply_handler(update, context):
         return
 
     forwarded_id = reply_msg.message_id
-    user_chat = context.bot_data.get("forwarded_map", {}).get(forwarded_id)
+    user_chat = FORWARDED.get(forwarded_id)
 
     if not user_chat:
         return await update.message.reply_text("❌ User not found.")
@@ -177,18 +552,105 @@ async def admin_reply_handler(update, context):
 
 
 # ------------------------------------------------------
-# PHOTO HANDLER — forwards images
+# FORWARDING
+# Text is forwarded right away: spam control already drops a
+# second text within 1.2 s, so texts never arrive in bursts.
+# Photos (albums especially) do, so a burst from one chat goes
+# to the admin in one forwardMessages call; a text waits for
+# the chat's pending photos so the admin sees them in order.
 # ------------------------------------------------------
-async def photo_handler(update: Update, context):
+async def forward_now(update, context):
+    chat_id = update.effective_chat.id
+    await flush_forwards_now(chat_id, context)
     try:
         fwd = await context.bot.forward_message(
             chat_id=ADMIN_ID,
-            from_chat_id=update.effective_chat.id,
+            from_chat_id=chat_id,
             message_id=update.message.message_id
         )
-        context.bot_data.setdefault("forwarded_map", {})[fwd.message_id] = update.effective_chat.id
-    except Exception as e:
-        log.error("Photo forward error: %s", e)
+    except TelegramError as e:
+        log.error("Forward error: %s", e)
+        return
+    _remember(FORWARDED, fwd.message_id, chat_id)
+
+
+FORWARD_DEBOUNCE = 0.15
+FORWARD_BATCH_MAX = 100
+
+_pending_forwards: dict[int, list[int]] = {}
+# chat id -> task that sends that chat's pending photo forwards
+_flush_tasks: dict[int, asyncio.Task] = {}
+
+
+def queue_forward(update, context):
+    chat_id = update.effective_chat.id
+    pending = _pending_forwards.get(chat_id)
+    if pending is not None:
+        pending.append(update.message.message_id)
+        return
+
+    _pending_forwards[chat_id] = [update.message.message_id]
+    _flush_tasks[chat_id] = context.application.create_task(
+        _flush_later(chat_id, context), update=update
+    )
+
+
+async def flush_forwards_now(chat_id, context):
+    # a text sent after a photo must not reach the admin before it
+    task = _flush_tasks.pop(chat_id, None)
+    if task is None or task.done():
+        return
+    if chat_id in _pending_forwards:
+        # still in its debounce sleep: send the batch ourselves
+        task.cancel()
+        await _flush_forwards(chat_id, context)
+    else:
+        await asyncio.shield(task)
+
+
+async def _flush_later(chat_id, context):
+    try:
+        await asyncio.sleep(FORWARD_DEBOUNCE)
+        await _flush_forwards(chat_id, context)
+    finally:
+        if _flush_tasks.get(chat_id) is asyncio.current_task():
+            del _flush_tasks[chat_id]
+
+
+async def _flush_forwards(chat_id, context):
+    # forwardMessages wants ids in increasing order
+    ids = sorted(_pending_forwards.pop(chat_id))
+
+    for i in range(0, len(ids), FORWARD_BATCH_MAX):
+        batch = ids[i:i + FORWARD_BATCH_MAX]
+        try:
+            fwds = await context.bot.forward_messages(
+                chat_id=ADMIN_ID,
+                from_chat_id=chat_id,
+                message_ids=batch
+            )
+        except TelegramError as e:
+            log.warning("Batch forward failed, sending one by one: %s", e)
+            fwds = []
+            for message_id in batch:
+                try:
+                    fwds.append(await context.bot.forward_message(
+                        chat_id=ADMIN_ID,
+                        from_chat_id=chat_id,
+                        message_id=message_id
+                    ))
+                except TelegramError as e:
+                    log.error("Forward error: %s", e)
+
+        for fwd in fwds:
+            _remember(FORWARDED, fwd.message_id, chat_id)
+
+
+# ------------------------------------------------------
+# PHOTO HANDLER — forwards images
+# ------------------------------------------------------
+async def photo_handler(update: Update, context):
+    queue_forward(update, context)
 
     await update.message.reply_text("Message sent ✅")
 
@@ -196,33 +658,27 @@ async def photo_handler(update: Update, context):
 # ------------------------------------------------------
 # MAIN MESSAGE HANDLER
 # ------------------------------------------------------
-async def handle_message(update, context):
+MAX_TEXT_LEN = 500
 
-    if user_spam(update, context):
-        return
 
-    text = update.message.text[:500]
+async def handle_message(update, context):
+
+    # no copy for short texts: CPython returns the same str when nothing is cut
+    text = update.message.text[:MAX_TEXT_LEN]
     lang = detect_language(text)
     name = update.effective_user.first_name or "Friend"
 
     # ------------------ GREETING REPLY ------------------
-    greetings = ["hi", "hello", "hey", "hlo", "hola", "namaste", "salam", "assalamualaikum"]
+    stripped = text.strip().lower()
 
-    if text.lower() in greetings:
+    bot_names = {context.bot.first_name.lower(), context.bot.username.lower()}
+    if is_greeting(stripped, bot_names):
         greeting = await smart_welcome(name, lang)
         return await update.message.reply_text(greeting)
 
     # ------------------ NORMAL LOGIC ---------------------
     # forward to admin silently
-    try:
-        fwd = await context.bot.forward_message(
-            chat_id=ADMIN_ID,
-            from_chat_id=update.effective_chat.id,
-            message_id=update.message.message_id
-        )
-        context.bot_data.setdefault("forwarded_map", {})[fwd.message_id] = update.effective_chat.id
-    except:
-        pass
+    await forward_now(update, context)
 
     await type_animation(update, context)
 
@@ -253,21 +709,89 @@ async def handle_message(update, context):
     return await update.message.reply_text("Message sent ✅")
 
 
+# ------------------------------------------------------
+# PER-CHAT DISPATCH
+# In order within a chat, concurrently across chats, so one
+# slow Gemini call doesn't stall everybody else.
+# ------------------------------------------------------
+_chat_queues: dict[int, deque] = {}
+
+
+async def _chat_worker(chat_id: int):
+    pending = _chat_queues[chat_id]
+    while pending:
+        callback, update, context = pending.popleft()
+        try:
+            await callback(update, context)
+        except Exception:
+            log.exception("Handler error in chat %s", chat_id)
+    # nothing can be appended between the empty check and here
+    del _chat_queues[chat_id]
+
+
+def per_chat(callback, spam_check=False):
+    async def enqueue(update, context):
+        # checked on arrival, not when the worker gets to it
+        if spam_check and user_spam(update, context):
+            return
+
+        chat_id = update.effective_chat.id
+        pending = _chat_queues.get(chat_id)
+        if pending is not None:
+            pending.append((callback, update, context))
+            return
+
+        _chat_queues[chat_id] = deque([(callback, update, context)])
+        context.application.create_task(_chat_worker(chat_id), update=update)
+
+    return enqueue
+
+
 # ------------------------------------------------------
 # START BOT
 # ------------------------------------------------------
 def main():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).persistence(persistence).build()
-
-    app.add_handler(CommandHandler("start", start_cmd))
+    # libuv event loop; not available on Windows
+    if sys.platform != "win32":
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        # concurrent Bot API calls share pooled HTTP/2 connections
+        .request(HTTPXRequest(
+            connection_pool_size=256,
+            http_version="2",
+            read_timeout=20,
+            connect_timeout=10
+        ))
+        .get_updates_request(HTTPXRequest(http_version="2"))
+        .persistence(persistence)
+        # queue outgoing calls under Telegram's 30 msg/s cap, retry on 429
+        .rate_limiter(AIORateLimiter(overall_max_rate=29, max_retries=3))
+        .post_init(post_init)
+        .build()
+    )
+
+    app.add_handler(CommandHandler("start", per_chat(start_cmd)))
     app.add_handler(CommandHandler("available", available_cmd))
     app.add_handler(CommandHandler("away", away_cmd))
     app.add_handler(MessageHandler(filters.REPLY & filters.TEXT, admin_reply_handler))
-    app.add_handler(MessageHandler(filters.PHOTO, photo_handler))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-
-    print("🚀 Bot Running...")
-    app.run_polling()
+    app.add_handler(MessageHandler(filters.PHOTO, per_chat(photo_handler)))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, per_chat(handle_message, spam_check=True)))
+
+    log.info("🚀 Bot Running...")
+    if WEBHOOK_URL:
+        # plain HTTP; put a TLS-terminating reverse proxy in front
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WH_SECRET
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":